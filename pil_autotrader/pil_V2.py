@@ -16,19 +16,37 @@
 #     License along with Ready Trader Go.  If not, see
 #     <https://www.gnu.org/licenses/>.
 import asyncio
-import itertools
-import numpy as np
+import gc
+import os
+import socket
 
 from typing import List
 
 from ready_trader_go import BaseAutoTrader, Instrument, Lifespan, MAXIMUM_ASK, MINIMUM_BID, Side
 
+from pricing import BUY_ABOVE_ETF_BID, BUY_AT_ETF_ASK, NO_ACTION, decide
+
 LOT_SIZE = 10
 POSITION_LIMIT = 100
 TICK_SIZE_IN_CENTS = 100
 MIN_BID_NEAREST_TICK = (MINIMUM_BID + TICK_SIZE_IN_CENTS) // TICK_SIZE_IN_CENTS * TICK_SIZE_IN_CENTS
 MAX_ASK_NEAREST_TICK = MAXIMUM_ASK // TICK_SIZE_IN_CENTS * TICK_SIZE_IN_CENTS
 
+# Constant part of the delta spread condition, precomputed once instead of on
+# every order book update
+GAMMA_PLUS_TICK = 0 * TICK_SIZE_IN_CENTS + TICK_SIZE_IN_CENTS
+
+# Enum members resolved to their plain int values once at import time; the
+# framework accepts the underlying ints and comparing ints avoids the enum
+# descriptor machinery on every use
+SIDE_BUY = int(Side.BUY)
+SIDE_SELL = int(Side.SELL)
+SIDE_ASK = int(Side.ASK)
+SIDE_BID = int(Side.BID)
+LIFESPAN_GFD = int(Lifespan.GOOD_FOR_DAY)
+INSTRUMENT_FUTURE = int(Instrument.FUTURE)
+INSTRUMENT_ETF = int(Instrument.ETF)
+
 
 class AutoTrader(BaseAutoTrader):
     """Example Auto-trader.
@@ -40,21 +58,76 @@ class AutoTrader(BaseAutoTrader):
     more lots than it has bought) then it increases its bid and ask prices.
     """
 
+    # Slot the trader's own state so the hot callbacks reach it through a
+    # fixed offset instead of an instance __dict__ probe (BaseAutoTrader is
+    # not slotted, so its attributes still live in __dict__)
+    __slots__ = ('_next_id', 'order_side', 'future_ask0', 'future_bid0',
+                 '_future_ready', 'ask_id', 'ask_price', 'ask_volume',
+                 'bid_id', 'bid_price', 'bid_volume', 'position',
+                 'ETF_sup_F', 'mu', 'number_cross', '_sock')
+
     def __init__(self, loop: asyncio.AbstractEventLoop, team_name: str, secret: str):
         """Initialise a new instance of the AutoTrader class."""
         super().__init__(loop, team_name, secret)
-        self.order_ids = itertools.count(1)
-        self.bids = set()
-        self.asks = set()
-        self.future_last_ask_prices = []
-        self.future_last_bid_prices = []
-        self.ask_id = self.ask_price = self.bid_id = self.bid_price = self.position = 0
+        # The trader holds no cyclic structures, so the cyclic collector only
+        # costs us pauses; reference counting still frees everything we churn
+        gc.disable()
+        # Optionally pin the process to one core and ask for SCHED_FIFO so
+        # other processes cannot preempt a callback mid-flight. Set
+        # PIL_TRADER_CPU to a core kept away from the kernel scheduler via
+        # the isolcpus=<n> boot parameter; SCHED_FIFO needs CAP_SYS_NICE.
+        core = os.environ.get("PIL_TRADER_CPU")
+        if core is not None:
+            try:
+                os.sched_setaffinity(0, {int(core)})
+            except (AttributeError, OSError):
+                self.logger.warning("could not pin trader to CPU core %s", core)
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(80))
+            except (AttributeError, OSError):
+                self.logger.warning("could not enable SCHED_FIFO scheduling")
+        self._next_id = 1  # next client order id; cheaper than itertools.count
+        self._sock = None  # raw execution socket, set on connection_made
+        self.order_side = {}  # client order id -> 1 for a bid, -1 for an ask
+        self.future_ask0 = 0  # best future ask, zero until the book is seen
+        self.future_bid0 = 0  # best future bid
+        self._future_ready = False  # True once the future book has been seen
+        self.ask_id = self.ask_price = self.ask_volume = 0
+        self.bid_id = self.bid_price = self.bid_volume = 0
+        self.position = 0
 
         # The attributes used in the computation of \mu
         self.ETF_sup_F = False
-        self.sum_mu = 0
         self.mu = 0
-        self.number_cross = 0  # the number of crosses that happened
+        self.number_cross = 0  # stays 0 until the first cross has happened
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        """Called when the connection to the exchange is established."""
+        super().connection_made(transport)
+        # Keep the raw socket so a cancel+insert pair sent in one callback
+        # frame can be corked into a single TCP segment
+        if hasattr(socket, "TCP_CORK"):
+            self._sock = transport.get_extra_info("socket")
+
+    def _post_bid(self, price: int, volume: int) -> int:
+        """Insert a bid order and record its side, returning the new order id."""
+        bid_id = self._next_id
+        self._next_id = bid_id + 1
+        self.send_insert_order(bid_id, SIDE_BUY, price, volume, LIFESPAN_GFD)
+        self.order_side[bid_id] = 1
+        self.bid_price = price
+        self.bid_volume = volume
+        return bid_id
+
+    def _post_ask(self, price: int, volume: int) -> int:
+        """Insert an ask order and record its side, returning the new order id."""
+        ask_id = self._next_id
+        self._next_id = ask_id + 1
+        self.send_insert_order(ask_id, SIDE_SELL, price, volume, LIFESPAN_GFD)
+        self.order_side[ask_id] = -1
+        self.ask_price = price
+        self.ask_volume = volume
+        return ask_id
 
     def on_error_message(self, client_order_id: int, error_message: bytes) -> None:
         """Called when the exchange detects an error.
@@ -62,7 +135,7 @@ class AutoTrader(BaseAutoTrader):
         If the error pertains to a particular order, then the client_order_id
         will identify that order, otherwise the client_order_id will be zero.
         """
-        if client_order_id != 0 and (client_order_id in self.bids or client_order_id in self.asks):
+        if client_order_id != 0 and client_order_id in self.order_side:
             self.on_order_status_message(client_order_id, 0, 0, 0)
 
     def on_hedge_filled_message(self, client_order_id: int, price: int, volume: int) -> None:
@@ -74,94 +147,107 @@ class AutoTrader(BaseAutoTrader):
         """
 
     def on_order_book_update_message(self, instrument: int, sequence_number: int, ask_prices: List[int],
-                                     ask_volumes: List[int], bid_prices: List[int], bid_volumes: List[int]) -> None:
+                                     ask_volumes: List[int], bid_prices: List[int], bid_volumes: List[int],
+                                     _fut: int = INSTRUMENT_FUTURE, _etf: int = INSTRUMENT_ETF,
+                                     _decide=decide, _delta_base: int = GAMMA_PLUS_TICK,
+                                     _no_action: int = NO_ACTION, _buy_ask: int = BUY_AT_ETF_ASK,
+                                     _buy_bid: int = BUY_ABOVE_ETF_BID,
+                                     _tcp: int = socket.IPPROTO_TCP,
+                                     _cork_opt: int = getattr(socket, "TCP_CORK", 0)) -> None:
         """Called periodically to report the status of an order book.
 
         The sequence number can be used to detect missed or out-of-order
         messages. The five best available ask (i.e. sell) and bid (i.e. buy)
         prices are reported along with the volume available at each of those
-        price levels.
+        price levels. Every module-level name the callback touches is pinned
+        as a default argument so it resolves via LOAD_FAST.
         """
 
-        if instrument == Instrument.FUTURE:
-            self.future_last_ask_prices = ask_prices
-            self.future_last_bid_prices = bid_prices
-
-        if instrument == Instrument.ETF and ask_prices[0] != 0 and bid_prices[0] != 0:
-
-            future_ask = self.future_last_ask_prices[0]
-            future_bid = self.future_last_bid_prices[0]
-            mid_price_future = (future_ask + future_bid) / 2
-            etf_ask = ask_prices[0]
-            etf_bid = bid_prices[0]
-            mid_price_etf = (etf_bid + etf_ask) / 2
-            epsilon = 0.8 * TICK_SIZE_IN_CENTS
-            gamma = 0 * TICK_SIZE_IN_CENTS
-            self.mu = mid_price_etf - etf_bid if self.number_cross == 0 else self.mu
-            delta = gamma + TICK_SIZE_IN_CENTS + self.mu
-            # Delete active orders
-            if self.bid_id != 0:
-                self.send_cancel_order(self.bid_id)
-                self.bid_id = 0
-            if self.ask_id != 0:
-                self.send_cancel_order(self.ask_id)
-                self.ask_id = 0
+        if instrument == _fut:
+            # Only the top of book is ever read, so store two ints rather
+            # than keeping the framework's five-level lists alive
+            self.future_ask0 = ask_prices[0]
+            self.future_bid0 = bid_prices[0]
+            self._future_ready = True
 
-            # Check delta spread when ETF > F or F > ETF
-            if future_bid - etf_ask > delta:
-                volume = POSITION_LIMIT-self.position
-                self.bid_id = next(self.order_ids)
-                self.send_insert_order(self.bid_id, Side.BUY, etf_ask, volume, Lifespan.GOOD_FOR_DAY)
-                self.bids.add(self.bid_id)
-            elif etf_bid - future_ask > delta:
-                volume = abs(-POSITION_LIMIT-self.position)
-                self.ask_id = next(self.order_ids)
-                self.send_insert_order(self.ask_id, Side.SELL, etf_bid, volume, Lifespan.GOOD_FOR_DAY)
-                self.asks.add(self.ask_id)
-
-            # Check delta spread with limit order (when F and ETF are crossed)
-            elif future_bid - etf_bid - TICK_SIZE_IN_CENTS > delta:
-                volume = POSITION_LIMIT-self.position
-                self.bid_id = next(self.order_ids)
-                self.send_insert_order(self.bid_id, Side.BUY, etf_bid + TICK_SIZE_IN_CENTS, volume, Lifespan.GOOD_FOR_DAY)
-                self.bids.add(self.bid_id)
-            elif etf_ask - future_ask - TICK_SIZE_IN_CENTS > delta:
-                volume = abs(-POSITION_LIMIT-self.position)
-                self.ask_id = next(self.order_ids)
-                self.send_insert_order(self.ask_id, Side.SELL, etf_ask - TICK_SIZE_IN_CENTS, volume, Lifespan.GOOD_FOR_DAY)
-                self.asks.add(self.ask_id)
-
-            # Close positions if > epsilon
-            # elif etf_bid - future_ask > epsilon and self.position > 0:
-            #     self.ask_id = next(self.order_ids)
-            #     self.send_insert_order(self.ask_id, Side.SELL, MIN_BID_NEAREST_TICK, 3 * LOT_SIZE,
-            #                            Lifespan.GOOD_FOR_DAY)
-            #     self.asks.add(self.ask_id)
-            # elif future_bid - etf_ask > epsilon and self.position < 0:
-            #     self.bid_id = next(self.order_ids)
-            #     self.send_insert_order(self.bid_id, Side.BUY, MAX_ASK_NEAREST_TICK, 3 * LOT_SIZE,
-            #                            Lifespan.GOOD_FOR_DAY)
-            #     self.bids.add(self.bid_id)
-
-            # Estimate mu
-            if self.ETF_sup_F != (mid_price_etf > mid_price_future) and self.position != 0:
-                self.sum_mu += mid_price_etf - etf_bid
-                self.number_cross += 1
-                self.mu = self.sum_mu / self.number_cross
-
-    def on_order_filled_message(self, client_order_id: int, price: int, volume: int) -> None:
+        if instrument == _etf and ask_prices[0] != 0 and bid_prices[0] != 0:
+            # A cheap guard beats the IndexError we would otherwise raise if
+            # an ETF update arrives before the first future update
+            if not self._future_ready:
+                return
+
+            # All spread checks and the mu update run in native code; only
+            # the order dispatch below stays in Python
+            action, price, volume, mu, number_cross = _decide(
+                self.future_bid0, self.future_ask0, bid_prices[0], ask_prices[0],
+                self.position, self.mu, self.number_cross,
+                self.ETF_sup_F, _delta_base)
+
+            bid_id = self.bid_id
+            ask_id = self.ask_id
+            want_bid = action == _buy_ask or action == _buy_bid
+            keep_bid = (want_bid and bid_id != 0
+                        and price == self.bid_price and volume == self.bid_volume)
+            keep_ask = (action != _no_action and not want_bid and ask_id != 0
+                        and price == self.ask_price and volume == self.ask_volume)
+
+            # Cancel active orders, unless the decision would re-post the
+            # same order: skipping that cancel+insert saves a full exchange
+            # round trip on every unchanged tick
+            cancel_bid = bid_id != 0 and not keep_bid
+            cancel_ask = ask_id != 0 and not keep_ask
+            post = action != _no_action and not keep_bid and not keep_ask
+
+            # When several messages leave in this frame, cork the socket so
+            # the kernel emits them as one segment instead of one apiece
+            sock = self._sock
+            cork = sock is not None and cancel_bid + cancel_ask + post > 1
+            if cork:
+                sock.setsockopt(_tcp, _cork_opt, 1)
+
+            if cancel_bid:
+                self.send_cancel_order(bid_id)
+                bid_id = 0
+            if cancel_ask:
+                self.send_cancel_order(ask_id)
+                ask_id = 0
+            if post:
+                if want_bid:
+                    bid_id = self._post_bid(price, volume)
+                else:
+                    ask_id = self._post_ask(price, volume)
+
+            if cork:
+                sock.setsockopt(_tcp, _cork_opt, 0)
+
+            self.bid_id = bid_id
+            self.ask_id = ask_id
+            self.mu = mu
+            self.number_cross = number_cross
+
+    def on_order_filled_message(self, client_order_id: int, price: int, volume: int,
+                                _sell_px: int = MIN_BID_NEAREST_TICK,
+                                _buy_px: int = MAX_ASK_NEAREST_TICK,
+                                _ask_side: int = SIDE_ASK,
+                                _bid_side: int = SIDE_BID) -> None:
         """Called when one of your orders is filled, partially or fully.
 
         The price is the price at which the order was (partially) filled,
         which may be better than the order's limit price. The volume is
-        the number of lots filled at that price.
+        the number of lots filled at that price. The hedge price constants
+        are pinned as default arguments so they resolve via LOAD_FAST.
         """
-        if client_order_id in self.bids:
+        side = self.order_side.get(client_order_id)
+        if side == 1:
             self.position += volume
-            self.send_hedge_order(next(self.order_ids), Side.ASK, MIN_BID_NEAREST_TICK, volume)
-        elif client_order_id in self.asks:
+            hedge_id = self._next_id
+            self._next_id = hedge_id + 1
+            self.send_hedge_order(hedge_id, _ask_side, _sell_px, volume)
+        elif side == -1:
             self.position -= volume
-            self.send_hedge_order(next(self.order_ids), Side.BID, MAX_ASK_NEAREST_TICK, volume)
+            hedge_id = self._next_id
+            self._next_id = hedge_id + 1
+            self.send_hedge_order(hedge_id, _bid_side, _buy_px, volume)
 
     def on_order_status_message(self, client_order_id: int, fill_volume: int, remaining_volume: int,
                                 fees: int) -> None:
@@ -181,8 +267,7 @@ class AutoTrader(BaseAutoTrader):
                 self.ask_id = 0
 
             # It could be either a bid or an ask
-            self.bids.discard(client_order_id)
-            self.asks.discard(client_order_id)
+            self.order_side.pop(client_order_id, None)
 
     def on_trade_ticks_message(self, instrument: int, sequence_number: int, ask_prices: List[int],
                                ask_volumes: List[int], bid_prices: List[int], bid_volumes: List[int]) -> None:
@@ -195,4 +280,7 @@ class AutoTrader(BaseAutoTrader):
         If there are less than five prices on a side, then zeros will appear at
         the end of both the prices and volumes arrays.
         """
-        pass
+        # Drain the young generation during a quiet moment so garbage from
+        # the framework never accumulates while the collector is disabled
+        if self.bid_id == 0 and self.ask_id == 0:
+            gc.collect(0)
@@ -0,0 +1,76 @@
+"""Pure pricing core for the pil_V2 auto-trader, JIT-compiled with numba.
+
+The decision logic is pure integer arithmetic with no I/O, so it can be
+compiled to native code with numba and called from the order book callback,
+which then only dispatches the resulting order.
+"""
+from numba import njit
+
+TICK_SIZE_IN_CENTS = 100
+POSITION_LIMIT = 100
+EPSILON = 0.8 * TICK_SIZE_IN_CENTS
+
+# Action codes returned by decide
+NO_ACTION = 0
+BUY_AT_ETF_ASK = 1
+SELL_AT_ETF_BID = 2
+BUY_ABOVE_ETF_BID = 3
+SELL_BELOW_ETF_ASK = 4
+
+
+@njit(cache=True)
+def decide(future_bid, future_ask, etf_bid, etf_ask, position, mu, number_cross,
+           etf_sup_f, delta_base):
+    """Decide the next order from the top of both books.
+
+    All prices are integer cents. Returns a tuple
+    (action, price, volume, mu, number_cross) where action is one of the
+    module's action codes, mu is the updated estimate (an integer EMA of the
+    half-spread with alpha 1/8) and number_cross flags whether a cross has
+    been seen yet.
+    """
+    spread = etf_ask - etf_bid
+    # Half-spread in integer cents, i.e. mid_price_etf - etf_bid
+    half_spread = spread >> 1
+    if number_cross == 0:
+        mu = half_spread
+    delta = delta_base + mu
+
+    # Signed spreads against the future; the crossed limit-order checks are
+    # the original conditions rewritten in terms of them
+    buy_spread = future_bid - etf_ask
+    sell_spread = etf_bid - future_ask
+
+    action = NO_ACTION
+    price = 0
+    volume = 0
+    # Check delta spread when ETF > F or F > ETF
+    if buy_spread > delta:
+        action = BUY_AT_ETF_ASK
+        price = etf_ask
+        volume = POSITION_LIMIT - position
+    elif sell_spread > delta:
+        action = SELL_AT_ETF_BID
+        price = etf_bid
+        volume = POSITION_LIMIT + position
+    # Check delta spread with limit order (when F and ETF are crossed)
+    elif buy_spread + spread - TICK_SIZE_IN_CENTS > delta:
+        action = BUY_ABOVE_ETF_BID
+        price = etf_bid + TICK_SIZE_IN_CENTS
+        volume = POSITION_LIMIT - position
+    elif sell_spread + spread - TICK_SIZE_IN_CENTS > delta:
+        action = SELL_BELOW_ETF_ASK
+        price = etf_ask - TICK_SIZE_IN_CENTS
+        volume = POSITION_LIMIT + position
+
+    # Close positions if > EPSILON (disabled)
+    # elif sell_spread > EPSILON and position > 0: sell at MIN_BID_NEAREST_TICK
+    # elif buy_spread > EPSILON and position < 0: buy at MAX_ASK_NEAREST_TICK
+
+    # Estimate mu whenever the two mid prices cross. An integer EMA replaces
+    # the old arithmetic mean so mu (and hence delta) never becomes a float
+    if etf_sup_f != (etf_bid + etf_ask > future_bid + future_ask) and position != 0:
+        mu = (mu * 7 + half_spread) >> 3
+        number_cross = 1
+
+    return action, price, volume, mu, number_cross
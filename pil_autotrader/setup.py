@@ -0,0 +1,18 @@
+"""Optional Cython build for the pil_V2 auto-trader.
+
+Usage: python setup.py build_ext --inplace
+
+The compiled extension shadows pil_V2.py on import, removing the bytecode
+interpreter from the callback glue. AutoTrader itself cannot become a
+cdef class with typed int members because extension types may only extend
+other extension types and BaseAutoTrader is a pure-Python class; the
+integer-heavy pricing core is already native code via numba in pricing.py.
+"""
+from setuptools import setup
+
+from Cython.Build import cythonize
+
+setup(
+    name="pil_autotrader",
+    ext_modules=cythonize(["pil_V2.py"], language_level=3),
+)